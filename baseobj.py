@@ -596,6 +596,27 @@ class BaseObj(object):
             if self._attrlist is not None:
                 kwts = (getattr(self, attr) for attr in self._attrlist)
             kwds = self.__dict__.copy()
+            # Include the attributes stored in slots as named attributes,
+            # the slots could be defined by any class in the hierarchy
+            attrlist = self._attrlist if self._attrlist is not None else ()
+            for cls in type(self).__mro__:
+                slots = cls.__dict__.get("__slots__", ())
+                if isinstance(slots, str):
+                    slots = (slots,)
+                for attr in slots:
+                    if attr[0] == "_" or attr in kwds:
+                        # Skip private attributes
+                        continue
+                    try:
+                        # Get the slot value without calling __getattr__
+                        kwds[attr] = cls.__dict__[attr].__get__(self)
+                    except AttributeError:
+                        # Slot is not set, only the attributes in _attrlist
+                        # could be created on demand by __getattr__
+                        if attr in attrlist:
+                            kwds[attr] = getattr(self, attr, None)
+                        else:
+                            kwds[attr] = None
             if self._globals:
                 # Include the shared attributes as named attributes
                 kwds.update(self._globals)
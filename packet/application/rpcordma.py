@@ -15,7 +15,9 @@
 """
 RPCORDMA decoding module
 """
+import struct
 import nfstest_config as c
+from array import array
 from packet.utils import *
 from baseobj import BaseObj
 from packet.unpack import Unpack
@@ -27,6 +29,9 @@ __copyright__ = "Copyright (C) 2017 NetApp, Inc."
 __license__   = "GPL v2"
 __version__   = "1.0"
 
+# Module variables
+RDMA_MSGP_DECODE = True  # Decode the obsoleted RDMA_MSGP header when True
+
 # RFC 8166 Remote Direct Memory Access Transport for Remote Procedure Call
 #
 # Basic data types
@@ -35,6 +40,13 @@ uint32 = Unpack.unpack_uint
 int64  = Unpack.unpack_int64
 uint64 = Unpack.unpack_uint64
 
+# Pre-compiled structures for the fixed size RDMA segments
+_SEG        = struct.Struct("!IIQ")   # handle, length, offset
+_READ_CHUNK = struct.Struct("!IIIQ")  # position, handle, length, offset
+# Pre-compiled structures for the fixed size headers
+_UINT32x2   = struct.Struct("!II")    # align, thresh or low, high
+_HEADER     = struct.Struct("!III")   # xid, vers, credit
+
 # Plain RDMA segment
 class xdr_rdma_segment(BaseObj):
     """
@@ -45,12 +57,23 @@ class xdr_rdma_segment(BaseObj):
        };
     """
     # Class attributes
+    __slots__ = ("handle", "length", "offset")
     _attrlist = ("handle", "length", "offset")
 
     def __init__(self, unpack):
-        self.handle = IntHex(uint32(unpack))
-        self.length = uint32(unpack)
-        self.offset = LongHex(uint64(unpack))
+        ulist = unpack.read_struct(_SEG)
+        self.handle = IntHex(ulist[0])
+        self.length = ulist[1]
+        self.offset = LongHex(ulist[2])
+
+    @classmethod
+    def _from_tuple(cls, ulist):
+        """Create segment from the already decoded (handle, length, offset)"""
+        obj = cls.__new__(cls)
+        obj.handle = IntHex(ulist[0])
+        obj.length = ulist[1]
+        obj.offset = LongHex(ulist[2])
+        return obj
 
 # RDMA read segment
 class xdr_read_chunk(BaseObj):
@@ -61,12 +84,25 @@ class xdr_read_chunk(BaseObj):
        };
     """
     # Class attributes
+    __slots__ = ("position", "target")
     _fattrs   = ("target",)
     _attrlist = ("position", "target")
 
     def __init__(self, unpack):
-        self.position = uint32(unpack)
-        self.target   = xdr_rdma_segment(unpack)
+        ulist = unpack.read_struct(_READ_CHUNK)
+        self.position = ulist[0]
+        # Segment fields have already been decoded with the position
+        self.target = xdr_rdma_segment._from_tuple(ulist[1:])
+
+    @classmethod
+    def _from_tuple(cls, ulist):
+        """Create read chunk from the already decoded
+           (position, handle, length, offset)
+        """
+        obj = cls.__new__(cls)
+        obj.position = ulist[0]
+        obj.target   = xdr_rdma_segment._from_tuple(ulist[1:])
+        return obj
 
 # Read list
 class xdr_read_list(BaseObj):
@@ -94,7 +130,15 @@ class xdr_write_chunk(BaseObj):
     _attrlist = ("target",)
 
     def __init__(self, unpack):
-        self.target = unpack.unpack_array(xdr_rdma_segment)
+        # All segments are decoded at once since they have a fixed size
+        self.target = [xdr_rdma_segment._from_tuple(x) for x in unpack.unpack_struct_array(_SEG)]
+
+    @classmethod
+    def _from_list(cls, tlist):
+        """Create write chunk from the list of already decoded segments"""
+        obj = cls.__new__(cls)
+        obj.target = [xdr_rdma_segment._from_tuple(x) for x in tlist]
+        return obj
 
 # Write list
 class xdr_write_list(BaseObj):
@@ -110,8 +154,95 @@ class xdr_write_list(BaseObj):
     def __init__(self, unpack):
         self.entry = xdr_write_chunk(unpack)
 
+def _write_chunk_raw(unpack):
+    """Decode write chunk as a list of tuples (handle, length, offset)"""
+    return unpack.unpack_struct_array(_SEG)
+
+class rdma_segment_arrays(BaseObj):
+    """Segments of a chunk list stored as a structure of arrays, one
+       array for each segment field, so aggregate operations over all
+       the segments do not have to go through every segment object,
+       e.g., sum(x.length) or x.handle.index(handle). The arrays could be
+       wrapped by NumPy without copying, e.g., numpy.frombuffer(x.length,
+       dtype=numpy.uint32).
+
+       Object definition:
+
+       rdma_segment_arrays(
+           position = array,  # XDR position of each segment (read list)
+           chunk    = array,  # Index of the write chunk each segment
+                              # belongs to (write list)
+           handle   = array,  # Registered memory handle
+           length   = array,  # Length of the chunk in bytes
+           offset   = array,  # Chunk virtual address or offset
+       )
+    """
+    # Class attributes
+    __slots__ = ("position", "chunk", "handle", "length", "offset")
+    _attrlist = ("position", "chunk", "handle", "length", "offset")
+
+    def __init__(self, rows, index):
+        """Constructor
+
+           rows:
+               List of tuples (index, handle, length, offset)
+           index:
+               Name of the attribute for the first item in each tuple
+        """
+        cols = tuple(zip(*rows)) if rows else ((), (), (), ())
+        setattr(self, index, array("I", cols[0]))
+        self.handle = array("I", cols[1])
+        self.length = array("I", cols[2])
+        self.offset = array("Q", cols[3])
+
+class rdma_chunk_lists(BaseObj):
+    """Base class for the RPCoRDMA headers having the chunk lists
+
+       The chunk lists are decoded as plain tuples so the working buffer
+       is positioned right after the chunk lists, but the read chunk and
+       write chunk objects are only created when the reads, writes or
+       reply attribute is first accessed.
+
+       The read list and write list segments are also available as a
+       structure of arrays (see rdma_segment_arrays) using the attributes
+       reads_soa and writes_soa, in which case no segment objects are
+       created at all.
+    """
+    # Class attributes
+    __slots__ = ("reads", "writes", "reply", "reads_soa", "writes_soa", "_rawlists")
+
+    def _unpack_chunk_lists(self, unpack):
+        """Decode the chunk lists as plain tuples"""
+        self._rawlists = (
+            unpack.unpack_struct_list(_READ_CHUNK),
+            unpack.unpack_list(_write_chunk_raw),
+            unpack.unpack_conditional(_write_chunk_raw),
+        )
+
+    def __getattr__(self, attr):
+        """Create the objects for the given chunk list attribute when it
+           is first accessed and save them as the attribute value
+        """
+        if attr == "reads":
+            value = [xdr_read_chunk._from_tuple(x) for x in self._rawlists[0]]
+        elif attr == "writes":
+            value = [xdr_write_chunk._from_list(x) for x in self._rawlists[1]]
+        elif attr == "reply":
+            rawlist = self._rawlists[2]
+            value = None if rawlist is None else xdr_write_chunk._from_list(rawlist)
+        elif attr == "reads_soa":
+            value = rdma_segment_arrays(self._rawlists[0], "position")
+        elif attr == "writes_soa":
+            # Flatten all segments in the write list
+            rows = [(i,) + x for i, tlist in enumerate(self._rawlists[1]) for x in tlist]
+            value = rdma_segment_arrays(rows, "chunk")
+        else:
+            return BaseObj.__getattr__(self, attr)
+        setattr(self, attr, value)
+        return value
+
 # Chunk lists
-class rpc_rdma_header(BaseObj):
+class rpc_rdma_header(rdma_chunk_lists):
     """
        struct rpc_rdma_header {
            xdr_read_list   *reads;
@@ -120,15 +251,14 @@ class rpc_rdma_header(BaseObj):
        };
     """
     # Class attributes
+    __slots__ = ()
     _strfmt2  = "reads: {0:len}, writes: {1:len}, reply: {2:?{2}:0}"
     _attrlist = ("reads", "writes", "reply")
 
     def __init__(self, unpack):
-        self.reads  = unpack.unpack_list(xdr_read_chunk)
-        self.writes = unpack.unpack_list(xdr_write_chunk)
-        self.reply  = unpack.unpack_conditional(xdr_write_chunk)
+        self._unpack_chunk_lists(unpack)
 
-class rpc_rdma_header_nomsg(BaseObj):
+class rpc_rdma_header_nomsg(rdma_chunk_lists):
     """
        struct rpc_rdma_header_nomsg {
            xdr_read_list   *reads;
@@ -137,16 +267,15 @@ class rpc_rdma_header_nomsg(BaseObj):
        };
     """
     # Class attributes
+    __slots__ = ()
     _strfmt2  = "reads: {0:len}, writes: {1:len}, reply: {2:?{2}:0}"
     _attrlist = ("reads", "writes", "reply")
 
     def __init__(self, unpack):
-        self.reads  = unpack.unpack_list(xdr_read_chunk)
-        self.writes = unpack.unpack_list(xdr_write_chunk)
-        self.reply  = unpack.unpack_conditional(xdr_write_chunk)
+        self._unpack_chunk_lists(unpack)
 
 # Not to be used: obsoleted by RFC 8166
-class rpc_rdma_header_padded(BaseObj):
+class rpc_rdma_header_padded(rdma_chunk_lists):
     """
        struct rpc_rdma_header_padded {
            uint32          align;    /* Padding alignment */
@@ -157,15 +286,13 @@ class rpc_rdma_header_padded(BaseObj):
        };
     """
     # Class attributes
+    __slots__ = ("align", "thresh")
     _strfmt2  = "reads: {2:len}, writes: {3:len}, reply: {4:?{4}:0}"
     _attrlist = ("align", "thresh", "reads", "writes", "reply")
 
     def __init__(self, unpack):
-        self.align  = uint32(unpack)
-        self.thresh = uint32(unpack)
-        self.reads  = unpack.unpack_list(xdr_read_chunk)
-        self.writes = unpack.unpack_list(xdr_write_chunk)
-        self.reply  = unpack.unpack_conditional(xdr_write_chunk)
+        self.align, self.thresh = unpack.read_struct(_UINT32x2)
+        self._unpack_chunk_lists(unpack)
 
 # Error handling
 class rpc_rdma_errcode(Enum):
@@ -185,8 +312,7 @@ class rpc_rdma_errvers(BaseObj):
     _attrlist = ("low", "high")
 
     def __init__(self, unpack):
-        self.low  = uint32(unpack)
-        self.high = uint32(unpack)
+        self.low, self.high = unpack.read_struct(_UINT32x2)
 
 class rpc_rdma_error(BaseObj):
     """
@@ -233,14 +359,22 @@ class rdma_body(BaseObj):
 
     def __init__(self, unpack):
         self.set_attr("proc", rdma_proc(unpack))
-        if self.proc == const.RDMA_MSG:
-            self.set_attr("rdma_msg", rpc_rdma_header(unpack), switch=True)
-        elif self.proc == const.RDMA_NOMSG:
-            self.set_attr("rdma_nomsg", rpc_rdma_header_nomsg(unpack), switch=True)
-        elif self.proc == const.RDMA_MSGP:
-            self.set_attr("rdma_msgp", rpc_rdma_header_padded(unpack), switch=True)
-        elif self.proc == const.RDMA_ERROR:
-            self.set_attr("rdma_error", rpc_rdma_error(unpack), switch=True)
+        item = _rdma_body_switch.get(self.proc)
+        if item is not None:
+            if not RDMA_MSGP_DECODE and self.proc == const.RDMA_MSGP:
+                # Do not decode the obsoleted header
+                return
+            name, body = item
+            self.set_attr(name, body(unpack), switch=True)
+
+# Attribute name and decoding object for each rdma_body case
+# -- case const.RDMA_DONE is void
+_rdma_body_switch = {
+    const.RDMA_MSG   : ("rdma_msg",   rpc_rdma_header),
+    const.RDMA_NOMSG : ("rdma_nomsg", rpc_rdma_header_nomsg),
+    const.RDMA_MSGP  : ("rdma_msgp",  rpc_rdma_header_padded),
+    const.RDMA_ERROR : ("rdma_error", rpc_rdma_error),
+}
 
 # Fixed header fields
 class RPCoRDMA(BaseObj):
@@ -253,6 +387,7 @@ class RPCoRDMA(BaseObj):
        };
     """
     # Class attributes
+    __slots__ = ("xid", "vers", "credit", "body", "psize", "data")
     _strname  = "RPCoRDMA"
     _fattrs   = ("body",)
     _strfmt1  = "RPCoRDMA   {3.proc} xid: {0}"
@@ -260,8 +395,9 @@ class RPCoRDMA(BaseObj):
     _attrlist = ("xid", "vers", "credit", "body", "psize")
 
     def __init__(self, unpack):
-        self.xid    = IntHex(uint32(unpack))
-        self.vers   = uint32(unpack)
-        self.credit = uint32(unpack)
+        ulist = unpack.read_struct(_HEADER)
+        self.xid    = IntHex(ulist[0])
+        self.vers   = ulist[1]
+        self.credit = ulist[2]
         self.body   = rdma_body(unpack)
         self.psize  = unpack.size()
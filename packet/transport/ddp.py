@@ -37,6 +37,9 @@ class DDP(BaseObj):
 
            x = DDP(pktt)
 
+           # Decode the DDP layer from the given Unpack object
+           x = DDP.decode(unpack, pktt)
+
        Object definition:
 
        DDP(
@@ -120,3 +123,22 @@ class DDP(BaseObj):
         size = unpack.size()
         if size > 0:
             self.data = unpack.read(size)
+
+    @classmethod
+    def decode(cls, unpack, pktt):
+        """Decode the DDP layer using the given Unpack object as the
+           working buffer instead of the one in the packet trace object.
+           The packet trace object Unpack object is restored afterwards.
+
+           unpack:
+               Unpack object having the DDP layer
+           pktt:
+               Packet trace object (packet.pktt.Pktt) so this layer has
+               access to the parent layers.
+        """
+        saved = pktt.unpack
+        pktt.unpack = unpack
+        try:
+            return cls(pktt)
+        finally:
+            pktt.unpack = saved
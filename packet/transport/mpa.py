@@ -18,11 +18,11 @@ Decode MPA layer.
 
 RFC 5044 Marker PDU Aligned Framing for TCP Specification
 """
+import struct
 import nfstest_config as c
 from baseobj import BaseObj
-from packet.unpack import Unpack
 from packet.transport.ddp import DDP
-from packet.utils import IntHex, Enum
+from packet.utils import IntHex, Enum, crc32c
 
 # Module constants
 __author__    = "Jorge Mora (%s)" % c.NFSTEST_AUTHOR_EMAIL
@@ -30,6 +30,9 @@ __copyright__ = "Copyright (C) 2021 NetApp, Inc."
 __license__   = "GPL v2"
 __version__   = "1.1"
 
+# Module variables
+MPA_CRC_CHECK = False  # Verify the CRC of every MPA packet when True
+
 MPA_Request_Frame = 0
 MPA_Reply_Frame   = 1
 
@@ -38,6 +41,23 @@ mpa_frame_type = {
     1 : "MPA_Reply_Frame",
 }
 
+# Number of padding bytes indexed by the two least significant bits of the
+# MPA length, so the MPA length (2 bytes) plus the ULPDU plus the padding
+# is a multiple of 4 bytes
+_MPA_PAD = (2, 1, 0, 3)
+
+# MPA Request/Reply Frame key given as two 64-bit integers
+_MPA_KEY    = struct.Struct("!QQ")
+_MPA_KEY_HI = 0x4d50412049442052 # "MPA ID R"
+_MPA_REQ_LO = 0x6571204672616d65 # "eq Frame"
+_MPA_REP_LO = 0x6570204672616d65 # "ep Frame"
+
+# The CRC-32C is transmitted in little endian byte order
+_MPA_CRC = struct.Struct("<I")
+
+# MPA Request/Reply Frame header: flags, revision and private data size
+_MPA_FRAME_HDR = struct.Struct("!BBH")
+
 class FrameType(Enum):
     """enum OpCode"""
     _enumdict = mpa_frame_type
@@ -58,6 +78,10 @@ class MPA(BaseObj):
                psize = int,  # Length of ULPDU
                pad   = int,  # Length of Padding bytes
                crc   = int,  # CRC 32 check value
+               crc_valid = bool, # CRC has been verified, only available
+                                 # when MPA_CRC_CHECK is True and the
+                                 # MPA Req/Rep frames in the trace show
+                                 # CRC usage has been negotiated
            ] | [
                # Connection Setup
                ftype    = int,   # Frame type
@@ -71,8 +95,11 @@ class MPA(BaseObj):
        )
     """
     # Class attributes
-    _attrlist = ("psize", "pad", "crc",
+    __slots__ = ("psize", "rpsize", "pad", "crc", "data", "crc_valid",
                  "ftype", "marker", "use_crc", "reject", "revision")
+    _attrlist = ("psize", "pad", "crc",
+                 "ftype", "marker", "use_crc", "reject", "revision",
+                 "crc_valid")
     _strfmt1  = "MPA   crc: {2}, pad: {1}, len: {0}"
     _strfmt2  = "crc: {2}, pad: {1}, len: {0}"
 
@@ -88,23 +115,27 @@ class MPA(BaseObj):
         unpack = pktt.unpack
         record = pktt.pkt.record
         offset = unpack.tell()
+        # Number of unprocessed bytes, it is updated as the bytes are
+        # processed instead of calling unpack.size() every time
+        remaining = unpack.size()
         self.psize = 0
         self.rpsize = 0
-        if unpack.size() < 8:
+        if remaining < 8:
             return
 
         # Decode the MPA length
         mpalen = unpack.unpack_ushort()
+        remaining -= 2
         self.psize = mpalen
 
         # MPA payload size: excluding the MPA CRC (4 bytes)
-        if record.length_orig < len(unpack):
+        if record.length_orig < remaining:
             # Reassembled message of TCP fragments
-            size = unpack.size()
+            size = remaining
         else:
-            size = record.length_orig - unpack.tell() - 4
+            size = record.length_orig - (offset + 2) - 4
         # Do not include any padding
-        self.pad = ((4 - ((mpalen+2) & 0x03)) & 0x03)
+        self.pad = _MPA_PAD[mpalen & 0x03]
         size -= self.pad
         self.rpsize = size
 
@@ -121,48 +152,74 @@ class MPA(BaseObj):
 
         # Get the CRC only if the whole frame was captured
         delta = record.length_orig - record.length_inc
-        size = unpack.size() - ((4-delta) if delta < 4 else 0)
-        data = bytes(0)
+        size = remaining - ((4-delta) if delta < 4 else 0)
+        dsize = 0
         if size > 0:
             # Use min between mpalen and size since size could be smaller
             # than mpalen if this is a truncated frame. It could be larger
             # if there is a full capture and there is padding
-            data = unpack.read(min(mpalen, size))
+            # -- Payload data is not copied
+            dsize = min(mpalen, size)
+            payload = unpack.subview(dsize)
+            remaining -= dsize
 
-        if self.pad and delta == 0 and unpack.size():
+        if self.pad and delta == 0 and remaining:
             # Get padding bytes
-            unpack.read(min(self.pad, unpack.size()))
+            npad = min(self.pad, remaining)
+            unpack.read(npad)
+            remaining -= npad
 
-        unpack_save = None
-        if delta == 0 and unpack.size() >= 4:
+        if delta == 0 and remaining >= 4:
+            if MPA_CRC_CHECK and unpack.tell() - offset == mpalen + self.pad + 2 \
+               and self._crc_negotiated(pktt):
+                # The CRC covers the MPA length, the ULPDU and the padding
+                # -- this check does not include any markers
+                fpdu = unpack.peek(unpack.tell() - offset, offset)
+                self.crc_valid = crc32c(fpdu) == unpack.peek_struct(_MPA_CRC)[0]
             # Get the CRC-32
             self.crc = IntHex(unpack.unpack_uint())
-            if unpack.size() > 0:
-                # Save original Unpack object right after this MPA packet
-                # so it is ready if there is another MPA packet within
-                # this TCP packet
-                unpack_save = unpack
-
-        if len(data) > 0:
-            # Replace Unpack object with just the payload data
-            # -- no padding and no CRC
-            unpack = Unpack(data)
-            pktt.unpack = unpack
 
-            # Decode payload
-            DDP(pktt)
+        if dsize > 0:
+            # Decode payload using just the payload data
+            # -- no padding and no CRC
+            # The original Unpack object is left right after this MPA
+            # packet so it is ready if there is another MPA packet
+            # within this TCP packet
+            DDP.decode(payload, pktt)
 
             # Get the un-dissected bytes
-            if unpack.size() > 0:
-                self.data = unpack.read(unpack.size())
-            if unpack_save is not None:
-                # Restore Unpack object
-                pktt.unpack = unpack_save
+            if payload.size() > 0:
+                self.data = payload.read(payload.size())
+
+    def _get_streams(self, pktt):
+        """Return the TCP stream objects for this direction and for the
+           reverse direction of the connection, either object is None if
+           it does not exist
+        """
+        ip  = pktt.pkt.ip
+        tcp = pktt.pkt.tcp
+        if ip is None or tcp is None:
+            return (None, None)
+        smap = pktt._tcp_stream_map
+        sfwd = "%s:%d-%s:%d" % (ip.src, tcp.src_port, ip.dst, tcp.dst_port)
+        srev = "%s:%d-%s:%d" % (ip.dst, tcp.dst_port, ip.src, tcp.src_port)
+        return (smap.get(sfwd), smap.get(srev))
+
+    def _crc_negotiated(self, pktt):
+        """Return True if CRC usage has been negotiated on this connection,
+           CRC is used if either the MPA Request or Reply frame has the
+           CRC usage flag set. The CRC field is not meaningful if this
+           information is not in the trace or CRC usage was not negotiated
+        """
+        for stream in self._get_streams(pktt):
+            if stream is not None and stream.mpa_crc:
+                return True
+        return False
 
     def _mpa_frame(self, pktt):
         """Dissect MPA Req/Rep Frame"""
         unpack = pktt.unpack
-        ulist  = unpack.unpack(4, "!BBH")
+        ulist  = unpack.read_struct(_MPA_FRAME_HDR)
         self.marker   = (ulist[0] >> 7) & 0x01
         self.use_crc  = (ulist[0] >> 6) & 0x01
         self.reject   = (ulist[0] >> 5) & 0x01
@@ -170,24 +227,32 @@ class MPA(BaseObj):
         self.psize    = ulist[2]
         self.data     = unpack.read(self.psize)
         pktt.pkt.add_layer("mpa", self)
+        # Save CRC usage for this direction of the connection
+        stream = self._get_streams(pktt)[0]
+        if stream is not None:
+            stream.mpa_crc = self.use_crc
 
     def _mpa_setup(self, pktt, mpalen, offset):
         """Dissect MPA Connection Setup"""
         unpack = pktt.unpack
         if mpalen == 0x4d50: # Could be the start of req/rep key: "MP"
             # Check if this is an MPA Request or Reply frame
-            unpack.seek(offset)
-            key = unpack.read(16)
-            if key == b"MPA ID Req Frame":
+            khi = klo = None
+            if unpack.size() + unpack.tell() - offset >= _MPA_KEY.size:
+                # Peek at the key without moving the offset pointer
+                khi, klo = unpack.peek_struct(_MPA_KEY, offset)
+            if khi == _MPA_KEY_HI and klo == _MPA_REQ_LO:
                 # MPA Request Frame
                 # key = 0x4d504120494420526571204672616d65
+                unpack.seek(offset + _MPA_KEY.size)
                 self._mpa_frame(pktt)
                 self.ftype    = FrameType(MPA_Request_Frame)
                 self._strfmt1 = "MPA   v{7:<3} {3}, marker: {4}, use_crc: {5}, len: {0}"
                 self._strfmt2 = "{3}, revision: {7}, marker: {4}, use_crc: {5}, len: {0}"
-            elif key == b"MPA ID Rep Frame":
+            elif khi == _MPA_KEY_HI and klo == _MPA_REP_LO:
                 # MPA Reply Frame
                 # key = 0x4d504120494420526570204672616d65
+                unpack.seek(offset + _MPA_KEY.size)
                 self._mpa_frame(pktt)
                 self.ftype    = FrameType(MPA_Reply_Frame)
                 self._strfmt1 = "MPA   v{7:<3} {3},   marker: {4}, use_crc: {5}, len: {0}, reject: {6}"
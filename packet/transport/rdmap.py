@@ -24,6 +24,7 @@ from packet.unpack import Unpack
 from packet.application.rpc import RPC
 from packet.utils import IntHex, LongHex, Enum
 from packet.application.rpcordma import RPCoRDMA
+import packet.application.rpcordma as rpcordma_mod
 import packet.application.rpcordma_const as rdma
 
 # Module constants
@@ -195,6 +196,10 @@ class RDMAP(BaseObj):
                 pktt.pkt.add_layer("rpcordma", rpcordma)
                 if rpcordma.proc == rdma.RDMA_ERROR:
                     return
+                if rpcordma.proc == rdma.RDMA_MSGP and not rpcordma_mod.RDMA_MSGP_DECODE:
+                    # The obsoleted RDMA_MSGP header has not been decoded so
+                    # there are no chunk lists to process
+                    return
                 if rpcordma.reads:
                     # Save RDMA read first fragment
                     rpcordma.data = unpack.read(len(unpack))
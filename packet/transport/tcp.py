@@ -62,6 +62,7 @@ class Stream(BaseObj):
         self.seq_wrap = 0  # Keep track when sequence number has wrapped around
         self.seq_base = seqno # Base sequence number to convert to relative sequence numbers
         self.segments = [] # Array of missing fragments, item: [start seq, end seq]
+        self.mpa_crc  = None # MPA CRC usage given in the MPA Req/Rep frame
 
     def add_fragment(self, data, seq):
         """Add fragment data to stream buffer"""
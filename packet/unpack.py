@@ -28,6 +28,10 @@ __version__   = "2.4"
 # Module variables
 UNPACK_ERROR = False  # Raise unpack error when True
 
+# Pre-compiled struct.Struct objects used by unpack_struct_list, where each
+# item is followed by the next item flag, keyed by the format of the item
+_list_structs = {}
+
 class Unpack(object):
     """Unpack object
 
@@ -39,6 +43,10 @@ class Unpack(object):
            # Get 32 bytes from the working buffer and move the offset pointer
            data = x.read(32)
 
+           # Get a new Unpack object for the next 32 bytes of the working
+           # buffer without copying any data and move the offset pointer
+           y = x.subview(32)
+
            # Get all the unprocessed bytes from the working buffer
            # (all bytes starting from the offset pointer)
            # Do not move the offset pointer
@@ -48,6 +56,11 @@ class Unpack(object):
            # Do not move the offset pointer
            data = x.getbytes(offset)
 
+           # Get a memoryview of 32 bytes from the working buffer starting
+           # at the given offset [default: current offset] without copying
+           # any data. Do not move the offset pointer
+           view = x.peek(32, offset)
+
            # Return the number of unprocessed bytes left in the working buffer
            size = x.size()
            size = len(x)
@@ -77,6 +90,14 @@ class Unpack(object):
            # Unpack an 'unsigned short' (2 bytes in network order)
            short_int = x.unpack(2, '!H')[0]
 
+           # Unpack using a pre-compiled struct.Struct object
+           sobj = struct.Struct('!HI')
+           ulist = x.read_struct(sobj)
+
+           # Unpack using a pre-compiled struct.Struct object at the given
+           # offset [default: current offset], do not move the offset pointer
+           ulist = x.peek_struct(sobj, offset)
+
            # Unpack different basic types
            char      = x.unpack_char()
            uchar     = x.unpack_uchar()
@@ -115,6 +136,9 @@ class Unpack(object):
            # Get an array of objects decoded by item_obj where the first
            # argument to item_obj is the unpack object, e.g., item = item_obj(x)
            alist = x.unpack_array(item_obj)
+           # Get an array of fixed size items decoded by the pre-compiled
+           # struct.Struct object sobj, each item is a tuple of unpack items
+           alist = x.unpack_struct_array(sobj)
 
            # Get a list of unsigned integers
            alist = x.unpack_list()
@@ -126,6 +150,9 @@ class Unpack(object):
            # Get a list of strings, the length of each string is given by
            # a short integer and each string is padded to a 4 byte boundary
            alist = x.unpack_list(Unpack.unpack_string, uargs={'ltype':Unpack.unpack_short, 'pad':4})
+           # Get a list of fixed size items decoded by the pre-compiled
+           # struct.Struct object sobj, each item is a tuple of unpack items
+           alist = x.unpack_struct_list(sobj)
 
            # Unpack a conditional, it unpacks a conditional flag first and
            # if it is true it unpacks the item given and returns it. If the
@@ -136,17 +163,30 @@ class Unpack(object):
            # a single long integer
            bitmask = unpack_bitmap()
     """
+    # Pre-compiled struct.Struct objects for the basic types
+    _S8  = struct.Struct('!b')
+    _U8  = struct.Struct('!B')
+    _S16 = struct.Struct('!h')
+    _U16 = struct.Struct('!H')
+    _S32 = struct.Struct('!i')
+    _U32 = struct.Struct('!I')
+    _S64 = struct.Struct('!q')
+    _U64 = struct.Struct('!Q')
+
     def __init__(self, data):
         """Constructor
 
            Initialize object's private data.
 
            data:
-               Raw packet data
+               Raw packet data, it could also be given as a memoryview
+               so the working buffer is not copied
         """
         self._offset = 0
         self._data = data
         self._state = []
+        # Data is copied out of the working buffer only if it is a memoryview
+        self._isview = isinstance(data, memoryview)
 
     def _get_ltype(self, ltype):
         """Get length of element"""
@@ -175,7 +215,8 @@ class Unpack(object):
 
     def append(self, data):
         """Append data to the working buffer."""
-        self._data += data
+        self._data = bytes(self._data) + data
+        self._isview = False
 
     def insert(self, data):
         """Insert data to the beginning of the current working buffer."""
@@ -187,6 +228,7 @@ class Unpack(object):
                 state.append(self._data)
         self._data = data + self._data[self._offset:]
         self._offset = 0
+        self._isview = isinstance(self._data, memoryview)
 
     def save_state(self):
         """Save state and return the state id"""
@@ -202,6 +244,7 @@ class Unpack(object):
             self._offset = state[1]
             if len(state) == 3:
                 self._data = state[2]
+                self._isview = isinstance(self._data, memoryview)
 
     def getbytes(self, offset=None):
         """Get the number of bytes given from the working buffer.
@@ -211,9 +254,25 @@ class Unpack(object):
                Starting offset of data to return [default: current offset]
         """
         if offset is None:
-            return self._data[self._offset:]
+            offset = self._offset
+        if self._isview:
+            return self._data[offset:].tobytes()
         return self._data[offset:]
 
+    def peek(self, size, offset=None):
+        """Get a memoryview of the number of bytes given from the working
+           buffer without copying any data.
+           Do not move the offset pointer.
+
+           size:
+               Length of data to get
+           offset:
+               Starting offset of data to return [default: current offset]
+        """
+        if offset is None:
+            offset = self._offset
+        return memoryview(self._data)[offset:offset+size]
+
     def read(self, size, pad=0):
         """Get the number of bytes given from the working buffer.
            Move the offset pointer.
@@ -232,8 +291,24 @@ class Unpack(object):
         dlen = len(self._data)
         if self._offset > dlen:
             self._offset = dlen
+        if self._isview:
+            return buf.tobytes()
         return buf
 
+    def subview(self, size):
+        """Get a new Unpack object having the number of bytes given from
+           the working buffer as its own working buffer. The data is not
+           copied, the new object references the same memory.
+           Move the offset pointer.
+
+           size:
+               Length of data to include in the new object
+        """
+        offset = self._offset
+        dlen = len(self._data)
+        self._offset = min(offset + size, dlen)
+        return Unpack(memoryview(self._data)[offset:self._offset])
+
     def unpack(self, size, fmt):
         """Get the number of bytes given from the working buffer and process
            it according to the given format.
@@ -246,37 +321,70 @@ class Unpack(object):
         """
         return struct.unpack(fmt, self.read(size))
 
+    def read_struct(self, sobj):
+        """Process the working buffer according to the given pre-compiled
+           struct.Struct object without creating an intermediate copy of
+           the data. Move the offset pointer by the size of the structure.
+           Return a tuple of unpack items, see struct.Struct.unpack_from.
+
+           sobj:
+               Pre-compiled struct.Struct object
+        """
+        try:
+            ret = sobj.unpack_from(self._data, self._offset)
+        except struct.error:
+            # Not enough data, discard the rest of the working buffer
+            self._offset = len(self._data)
+            raise
+        self._offset += sobj.size
+        return ret
+
+    def peek_struct(self, sobj, offset=None):
+        """Process the working buffer according to the given pre-compiled
+           struct.Struct object without creating an intermediate copy of
+           the data. Do not move the offset pointer.
+           Return a tuple of unpack items, see struct.Struct.unpack_from.
+
+           sobj:
+               Pre-compiled struct.Struct object
+           offset:
+               Starting offset of data to process [default: current offset]
+        """
+        if offset is None:
+            offset = self._offset
+        return sobj.unpack_from(self._data, offset)
+
     def unpack_char(self):
         """Get a signed char"""
-        return self.unpack(1, '!b')[0]
+        return self.read_struct(self._S8)[0]
 
     def unpack_uchar(self):
         """Get an unsigned char"""
-        return self.unpack(1, '!B')[0]
+        return self.read_struct(self._U8)[0]
 
     def unpack_short(self):
         """Get a signed short integer"""
-        return self.unpack(2, '!h')[0]
+        return self.read_struct(self._S16)[0]
 
     def unpack_ushort(self):
         """Get an unsigned short integer"""
-        return self.unpack(2, '!H')[0]
+        return self.read_struct(self._U16)[0]
 
     def unpack_int(self):
         """Get a signed integer"""
-        return self.unpack(4, '!i')[0]
+        return self.read_struct(self._S32)[0]
 
     def unpack_uint(self):
         """Get an unsigned integer"""
-        return self.unpack(4, '!I')[0]
+        return self.read_struct(self._U32)[0]
 
     def unpack_int64(self):
         """Get a signed 64 bit integer"""
-        return self.unpack(8, '!q')[0]
+        return self.read_struct(self._S64)[0]
 
     def unpack_uint64(self):
         """Get an unsigned 64 bit integer"""
-        return self.unpack(8, '!Q')[0]
+        return self.read_struct(self._U64)[0]
 
     def unpack_opaque(self, maxcount=0):
         """Get a variable length opaque up to a maximum length of maxcount"""
@@ -348,7 +456,38 @@ class Unpack(object):
                 break
         return ret
 
-    def unpack_list(self, *kwts, **kwds):
+    def unpack_struct_array(self, sobj, ltype=unpack_uint):
+        """Get a variable length array of fixed size items, where all the
+           items are decoded at once according to the given pre-compiled
+           struct.Struct object and the type to decode the length of the
+           array is given by ltype. Return a list of tuples of unpack items,
+           see struct.Struct.iter_unpack.
+
+           sobj:
+               Pre-compiled struct.Struct object for each item in the array
+           ltype:
+               Function to decode length of array [default: unpack_uint]
+               Could also be given as an integer to have a fixed length array
+        """
+        # Get length of array
+        slen = self._get_ltype(ltype)
+        # Decode only the items fully contained in the working buffer
+        count = min(slen, self.size() // sobj.size)
+        offset = self._offset
+        end = offset + count * sobj.size
+        if count < slen:
+            if UNPACK_ERROR:
+                # Decode the partial item to discard the rest of the
+                # working buffer and raise the same error as unpack_array
+                self._offset = end
+                self.read_struct(sobj)
+            # Not enough data, discard the rest of the working buffer
+            self._offset = len(self._data)
+        else:
+            self._offset = end
+        return list(sobj.iter_unpack(memoryview(self._data)[offset:end]))
+
+    def unpack_list(self, unpack_item=unpack_uint, ltype=unpack_uint, uargs={}):
         """Get an indeterminate size list, the type of objects in the list
            is given by the unpacking function unpack_item and the type
            to decode the next item flag is given by ltype
@@ -360,8 +499,59 @@ class Unpack(object):
            uargs:
                Named arguments to pass to unpack_item function [default: {}]
         """
-        kwds['islist'] = True
-        return self.unpack_array(*kwts, **kwds)
+        ret = []
+        append = ret.append
+        # Get the next item flag for the first item
+        flag = ltype(self)
+        while flag:
+            try:
+                # Unpack each item in the list and its next item flag
+                append(unpack_item(self, **uargs))
+                flag = ltype(self)
+            except:
+                if UNPACK_ERROR:
+                    raise
+                break
+        return ret
+
+    def unpack_struct_list(self, sobj):
+        """Get an indeterminate size list of fixed size items decoded
+           according to the given pre-compiled struct.Struct object, where
+           the next item flag is an unsigned integer. Each item is decoded
+           together with its next item flag in a single call.
+           Return a list of tuples of unpack items.
+
+           sobj:
+               Pre-compiled struct.Struct object for each item in the list,
+               the next item flag uses the same byte order
+        """
+        # Get the pre-compiled struct for the item and its next item flag
+        fsobj = _list_structs.get(sobj.format)
+        if fsobj is None:
+            fsobj = struct.Struct(sobj.format + "I")
+            _list_structs[sobj.format] = fsobj
+        fsize = fsobj.size
+        ret = []
+        append = ret.append
+        # Get the next item flag for the first item
+        flag = self.unpack_uint()
+        while flag:
+            if len(self._data) - self._offset >= fsize:
+                ulist = fsobj.unpack_from(self._data, self._offset)
+                self._offset += fsize
+                append(ulist[:-1])
+                flag = ulist[-1]
+            else:
+                # Not enough data to decode the item and its next item
+                # flag at once
+                try:
+                    append(self.read_struct(sobj))
+                    flag = self.unpack_uint()
+                except:
+                    if UNPACK_ERROR:
+                        raise
+                    break
+        return ret
 
     def unpack_conditional(self, unpack_item=unpack_uint, ltype=unpack_uint, uargs={}):
         """Get an item if condition flag given by ltype is true, if condition
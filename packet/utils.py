@@ -26,6 +26,12 @@ import nfstest_config as c
 from packet.unpack import Unpack
 from baseobj import BaseObj, fstrobj
 
+try:
+    # Use the hardware accelerated CRC-32C module if it is available
+    from crc32c import crc32c as _crc32c
+except ImportError:
+    _crc32c = None
+
 # Module constants
 __author__    = "Jorge Mora (%s)" % c.NFSTEST_AUTHOR_EMAIL
 __copyright__ = "Copyright (C) 2014 NetApp, Inc."
@@ -54,26 +60,40 @@ ENUM_REPR  = False  # If True, Enums are displayed as numbers
 # Module variables for Bitmaps
 BMAP_CHECK = False  # If True, bitmaps are strictly enforced
 
+def _crc32c_table():
+    """Return the CRC-32C (Castagnoli) lookup table"""
+    table = []
+    for crc in range(256):
+        for i in range(8):
+            crc = (crc >> 1) ^ (0x82f63b78 if crc & 1 else 0)
+        table.append(crc)
+    return tuple(table)
+_CRC32C_TABLE = _crc32c_table()
+
 class ByteHex(int):
     """Byte integer object which is displayed in hex"""
+    __slots__ = ()
     def __str__(self):
         return "0x%02x" % self
     __repr__ = __str__
 
 class ShortHex(int):
     """Short integer object which is displayed in hex"""
+    __slots__ = ()
     def __str__(self):
         return "0x%04x" % self
     __repr__ = __str__
 
 class IntHex(int):
     """Integer object which is displayed in hex"""
+    __slots__ = ()
     def __str__(self):
         return "0x%08x" % self
     __repr__ = __str__
 
 class LongHex(int):
     """Long integer object which is displayed in hex"""
+    __slots__ = ()
     def __str__(self):
         return "0x%016x" % self
     __repr__ = __str__
@@ -100,6 +120,12 @@ class Enum(int):
     """
     _offset = 0    # Strip the first bytes from the string name after conversion
     _enumdict = {} # Enum mapping dictionary to convert integer to string name
+    _enumobjs = {} # Instances already created for the valid enum values
+
+    def __init_subclass__(cls, **kwds):
+        """Give each subclass its own dictionary of instances"""
+        super(Enum, cls).__init_subclass__(**kwds)
+        cls._enumobjs = {}
 
     def __new__(cls, unpack):
         """Constructor which checks if integer is a valid enum value"""
@@ -109,12 +135,29 @@ class Enum(int):
         else:
             # Unpack integer
             value = unpack.unpack_int()
-        # Instantiate base class (integer class)
-        obj = super(Enum, cls).__new__(cls, value)
-        if ENUM_CHECK and obj._enumdict.get(value) is None:
-            raise EnumInval("value=%s not in enum '%s'" % (value, obj.__class__.__name__))
+        # Enum objects are immutable so a single instance is created
+        # for each valid enum value and then reused
+        obj = cls._enumobjs.get(value)
+        if obj is None:
+            # Instantiate base class (integer class)
+            obj = super(Enum, cls).__new__(cls, value)
+            if obj._enumdict.get(value) is None:
+                if ENUM_CHECK:
+                    raise EnumInval("value=%s not in enum '%s'" % (value, obj.__class__.__name__))
+            else:
+                # Do not save invalid values so the dictionary is bounded
+                # by the size of the enum mapping dictionary
+                cls._enumobjs[value] = obj
         return obj
 
+    def __setattr__(self, name, value):
+        """Enum objects are shared so they cannot be modified"""
+        raise AttributeError("'%s' object is read-only" % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        """Enum objects are shared so they cannot be modified"""
+        raise AttributeError("'%s' object is read-only" % self.__class__.__name__)
+
     def __str__(self):
         """Informal string representation, display value using the mapping
            dictionary provided as a class attribute
@@ -135,6 +178,25 @@ class Enum(int):
         else:
             return self.__str__()
 
+def crc32c(data, crc=0):
+    """Return the CRC-32C (Castagnoli) checksum of the given data.
+       The hardware accelerated crc32c module is used if it is installed,
+       otherwise the checksum is computed using a lookup table.
+
+       data:
+           Bytes-like object, e.g., bytes or memoryview
+       crc:
+           Checksum of the previous data when computing the checksum
+           of the concatenation of several buffers [default: 0]
+    """
+    if _crc32c is not None:
+        return _crc32c(data, crc)
+    table = _CRC32C_TABLE
+    crc ^= 0xffffffff
+    for byte in data:
+        crc = table[(crc ^ byte) & 0xff] ^ (crc >> 8)
+    return crc ^ 0xffffffff
+
 class BitmapInval(Exception):
     """Exception for an invalid bit number"""
     pass
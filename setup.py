@@ -49,6 +49,8 @@ setup(
     py_modules       = c.NFSTEST_MODULES,
     packages         = c.NFSTEST_PACKAGES,
     scripts          = c.NFSTEST_SCRIPTS,
+    # Optional module to speed up the verification of MPA CRCs
+    extras_require   = {'crc32c': ['crc32c']},
     cmdclass = {'build': Build},
     data_files = [
         # Man pages for scripts